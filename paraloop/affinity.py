@@ -0,0 +1,107 @@
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from threadpoolctl import threadpool_limits
+
+# Environment variables respected by the most common natively threaded libraries.
+THREAD_VARIABLES = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+
+def pinning_supported() -> bool:
+    """Check whether the platform supports pinning processes to CPUs, e.g. macOS does
+    not."""
+    return hasattr(os, "sched_getaffinity") and hasattr(os, "sched_setaffinity")
+
+
+def available_cpus() -> List[int]:
+    """Return the CPUs this process may run on, ordered by NUMA node if that information
+    is available, so that contiguous slices stay on the same node."""
+    if not pinning_supported():
+        return list(range(os.cpu_count() or 1))
+
+    cpus = sorted(os.sched_getaffinity(0))
+    nodes = _numa_nodes()
+    return sorted(cpus, key=lambda cpu: (nodes.get(cpu, 0), cpu))
+
+
+def cpu_sets(num_processes: int) -> List[List[int]]:
+    """Divide the available CPUs into `num_processes` disjoint sets.
+
+    If there are fewer CPUs than processes, each process is assigned a single CPU in a
+    round-robin fashion, so some processes will have to share.
+    """
+    cpus = available_cpus()
+    if len(cpus) < num_processes:
+        return [[cpus[i % len(cpus)]] for i in range(num_processes)]
+
+    return [
+        cpus[i * len(cpus) // num_processes : (i + 1) * len(cpus) // num_processes]
+        for i in range(num_processes)
+    ]
+
+
+def default_num_threads(num_processes: int) -> int:
+    """The number of native threads each worker may use without oversubscribing the
+    available CPUs."""
+    return max(1, len(available_cpus()) // num_processes)
+
+
+def pin_process(cpus: Sequence[int]):
+    """Restrict the current process to the specified CPUs."""
+    os.sched_setaffinity(0, cpus)
+
+
+def limit_threads(num_threads: int):
+    """Limit the number of threads used by natively threaded libraries such as OpenBLAS,
+    MKL and OpenMP in the current process.
+
+    Libraries that are loaded later on read the environment variables, while libraries
+    that have already been loaded (e.g. numpy's BLAS in a forked worker) are limited
+    through `threadpoolctl`.
+    """
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(num_threads)
+
+    return threadpool_limits(limits=num_threads)
+
+
+def configure(cpus: Optional[Sequence[int]], num_threads: Optional[int]):
+    """Pin the current process and limit its native threads, if requested."""
+    if cpus is not None:
+        pin_process(cpus)
+    if num_threads is not None:
+        return limit_threads(num_threads)
+    return None
+
+
+def _numa_nodes() -> Dict[int, int]:
+    """Map each CPU to its NUMA node, or return an empty mapping if the system doesn't
+    expose this information."""
+    nodes = {}
+    for path in Path("/sys/devices/system/node").glob("node[0-9]*"):
+        try:
+            cpulist = (path / "cpulist").read_text().strip()
+        except OSError:
+            continue
+        node = int(re.sub(r"\D", "", path.name))
+        for cpu in _parse_cpulist(cpulist):
+            nodes[cpu] = node
+    return nodes
+
+
+def _parse_cpulist(cpulist: str) -> List[int]:
+    """Parse a Linux cpulist such as `0-3,8-11`."""
+    cpus: List[int] = []
+    for part in filter(None, cpulist.split(",")):
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
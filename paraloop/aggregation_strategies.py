@@ -1,8 +1,9 @@
 import collections.abc as cabc
+import hashlib
 from abc import ABC, abstractclassmethod
 from itertools import chain
 from numbers import Number
-from typing import Any, Sequence
+from typing import Any, List, NamedTuple, Sequence
 
 import numpy as np
 
@@ -18,6 +19,67 @@ class AggregationStrategy(ABC):
         """Check if the object is compatible with this aggregation strategy."""
         return True
 
+    def snapshot(value: Any) -> Any:
+        """Return the information about the initial value that a worker needs to
+        `encode` its result later on, or None if the results should not be encoded."""
+        return None
+
+    def encode(snapshot: Any, value: Any) -> Any:
+        """Encode the value computed by a worker before it is sent to the master
+        process, e.g. to reduce its size.
+
+        Only called if `snapshot` returned something other than None for the initial
+        value. The result must be accepted by `aggregate`.
+        """
+        return value
+
+    def delta(original: Any, value: Any) -> Any:
+        """Return the change a single iteration made to the original value, so that it
+        can be replayed on top of a different original value with `apply_delta`.
+
+        By default, the value itself is the change, which holds for strategies that
+        require an empty initialization.
+        """
+        return value
+
+    def apply_delta(original: Any, delta: Any) -> Any:
+        """Apply a change obtained from `delta` to the original value.
+
+        The result must be accepted by `aggregate`.
+        """
+        return delta
+
+
+class SparseDelta(NamedTuple):
+    """The elements of a numpy array that were changed, stored as their flat (C-order)
+    indices and the difference with their original values."""
+
+    indices: np.ndarray
+    values: np.ndarray
+
+
+class ChangedBlocks(NamedTuple):
+    """The blocks of a (flattened) numpy array that were changed by a worker, stored as
+    the indices of the blocks and their concatenated new values.
+
+    Workers can detect changed blocks by comparing checksums, so unlike `SparseDelta`
+    this doesn't require them to keep a copy of the original array.
+    """
+
+    block_size: int
+    blocks: np.ndarray
+    values: np.ndarray
+
+
+def block_checksums(array: np.ndarray, block_size: int) -> List[bytes]:
+    """Compute a checksum of each block of `block_size` elements of a C-contiguous
+    array."""
+    flat = array.reshape(-1)
+    return [
+        hashlib.blake2b(flat[start : start + block_size], digest_size=8).digest()
+        for start in range(0, flat.size, block_size)
+    ]
+
 
 class Sum(AggregationStrategy):
     """Sums the cross-process results and the original value, subtracting the original
@@ -25,9 +87,13 @@ class Sum(AggregationStrategy):
     object is a mapping, keys that didn't exist on the original object will be created.
 
     Currently supports any default Python or Numpy number type and mappings of these
-    types.
+    types. If a worker only changed a small part of a numpy array, it only sends back
+    the blocks it changed, which are added to a single copy of the original.
     """
 
+    # The size of the blocks in which changes to numpy arrays are tracked, in bytes.
+    BLOCK_BYTES = 2 ** 16
+
     def aggregate(original: Any, new_values: Sequence[Any]) -> Any:
         # Special Mapping case
         if isinstance(original, cabc.Mapping):
@@ -41,9 +107,103 @@ class Sum(AggregationStrategy):
 
             return summed
 
+        # Sparse numpy case
+        sparse_types = (SparseDelta, ChangedBlocks)
+        sparse = [value for value in new_values if isinstance(value, sparse_types)]
+        if sparse:
+            dense = [
+                value for value in new_values if not isinstance(value, sparse_types)
+            ]
+            aggregated = np.ascontiguousarray(
+                original + sum([value - original for value in dense])
+            )
+            aggregated = aggregated.astype(
+                np.result_type(aggregated, *[value.values for value in sparse]),
+                copy=False,
+            )
+            flat = aggregated.reshape(-1)
+            for value in sparse:
+                if isinstance(value, SparseDelta):
+                    # The indices of a single delta are unique, so we can add in place.
+                    flat[value.indices] += value.values
+                    continue
+
+                flat_original = original.reshape(-1)
+                offset = 0
+                for block in value.blocks:
+                    start = block * value.block_size
+                    end = min(start + value.block_size, flat.size)
+                    new = value.values[offset : offset + end - start]
+                    flat[start:end] += new - flat_original[start:end]
+                    offset += end - start
+            return aggregated
+
         # Default case
         return original + sum([value - original for value in new_values])
 
+    def delta(original: Any, value: Any) -> Any:
+        if isinstance(original, cabc.Mapping):
+            return value
+
+        difference = value - original
+        if not isinstance(difference, np.ndarray):
+            return difference
+
+        indices = np.flatnonzero(difference)
+        delta = SparseDelta(indices, np.ravel(difference)[indices])
+        # Only worth it if it's significantly smaller than the full array.
+        if delta.indices.nbytes + delta.values.nbytes > difference.nbytes // 2:
+            return difference
+        return delta
+
+    def apply_delta(original: Any, delta: Any) -> Any:
+        # Sparse deltas are already relative to the original value.
+        if isinstance(original, cabc.Mapping) or isinstance(delta, SparseDelta):
+            return delta
+        return original + delta
+
+    def snapshot(value: Any) -> Any:
+        # Keep track of changes to C-contiguous numpy arrays using checksums, which takes
+        # far less memory than a copy of the original.
+        if not isinstance(value, np.ndarray) or not value.flags.c_contiguous:
+            return None
+
+        block_size = max(1, Sum.BLOCK_BYTES // value.itemsize)
+        return value.shape, value.dtype, block_checksums(value, block_size)
+
+    def encode(snapshot: Any, value: Any) -> Any:
+        shape, dtype, checksums = snapshot
+        if (
+            not isinstance(value, np.ndarray)
+            or not value.flags.c_contiguous
+            or value.shape != shape
+            or value.dtype != dtype
+        ):
+            return value
+
+        block_size = max(1, Sum.BLOCK_BYTES // value.itemsize)
+        blocks = [
+            block
+            for block, checksum in enumerate(block_checksums(value, block_size))
+            if checksum != checksums[block]
+        ]
+        # Only worth it if it's significantly smaller than the full array.
+        if len(blocks) * block_size * value.itemsize > value.nbytes // 2:
+            return value
+
+        flat = value.reshape(-1)
+        return ChangedBlocks(
+            block_size,
+            np.array(blocks, dtype=np.int64),
+            np.concatenate(
+                [
+                    flat[block * block_size : (block + 1) * block_size]
+                    for block in blocks
+                ]
+                + [flat[:0]]
+            ),
+        )
+
     def is_compatible(object: Any) -> bool:
         if isinstance(object, cabc.Mapping):
             if len(object.keys()) != 0:
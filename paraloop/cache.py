@@ -0,0 +1,86 @@
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+
+class IterationCache:
+    """Content-addressed on-disk cache of the effect of single loop iterations on the
+    Variables.
+
+    Each entry is keyed on the fingerprint of the transformed loop function and the
+    pickled iteration item, and contains the change that iteration made to each
+    Variable (see `AggregationStrategy.delta`). These changes can be replayed on top of
+    any initial value and aggregated like any other worker result.
+    Once the cache grows beyond `max_size` bytes, the least recently used entries are
+    evicted.
+
+    Note that only the loop body itself is part of the key: if an iteration depends on
+    anything other than its item (e.g. a function defined elsewhere, or a file on disk),
+    changes to it will not invalidate the cache.
+    """
+
+    def __init__(
+        self, directory: Union[str, Path], fingerprint: str, max_size: int = 2 ** 30
+    ):
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+        self.max_size = max_size
+        if self.max_size <= 0:
+            raise ValueError(
+                f"The maximum cache size must be positive! Received {max_size}."
+            )
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def key(self, item: Any) -> str:
+        """Compute the key of the cache entry for the given iteration item."""
+        digest = hashlib.sha256(self.fingerprint.encode())
+        digest.update(pickle.dumps(item))
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached Variable values for this key, or None on a cache miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                values = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Mark the entry as recently used.
+        os.utime(path)
+        return values
+
+    def store(self, key: str, values: Dict[str, Any]):
+        """Store the Variable values for this key.
+
+        Multiple workers may write to the cache at the same time, so the entry is
+        written to a temporary file first and moved into place atomically.
+        """
+        path = self._path(key)
+        temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as f:
+            pickle.dump(values, f)
+        os.replace(temporary_path, path)
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in `max_size`."""
+        entries = []
+        for path in self.directory.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
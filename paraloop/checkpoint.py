@@ -0,0 +1,59 @@
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Dict, Set, Union
+
+
+class Checkpoint:
+    """Persists the progress of a ParaLoop to disk, so that an interrupted loop can be
+    resumed later on.
+
+    The checkpoint contains the indices of all completed iterations and the values of
+    the Variables aggregated over those iterations. It is tied to the source code of the
+    loop, so that a checkpoint is never applied to a different loop by accident. Note
+    that resuming only makes sense if the iterable yields its items in the same order
+    every time.
+    """
+
+    def __init__(self, path: Union[str, Path], loop_source: str):
+        self.path = Path(path)
+        self.loop_source = loop_source
+
+        self.completed: Set[int] = set()
+        self.values: Dict[str, Any] = {}
+
+    def load(self) -> bool:
+        """Load the checkpoint from disk if it exists, returning whether it did."""
+        if not self.path.exists():
+            return False
+
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+
+        if state["loop_source"] != self.loop_source:
+            raise ValueError(
+                f"The checkpoint at {self.path} was created by a different loop! "
+                "Remove it or specify a different checkpoint path."
+            )
+
+        self.completed = state["completed"]
+        self.values = state["values"]
+        return True
+
+    def save(self):
+        """Atomically write the checkpoint to disk, so that being interrupted while
+        saving never leaves behind a corrupted checkpoint."""
+        state = {
+            "loop_source": self.loop_source,
+            "completed": self.completed,
+            "values": self.values,
+        }
+        temporary_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary_path, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(temporary_path, self.path)
+
+    def remove(self):
+        """Remove the checkpoint once the loop has finished."""
+        if self.path.exists():
+            self.path.unlink()
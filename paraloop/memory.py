@@ -0,0 +1,117 @@
+import os
+import threading
+from multiprocessing import Process, Queue
+from multiprocessing.synchronize import Event
+from typing import Dict, NamedTuple, Optional, Set
+
+
+class WorkerControl(NamedTuple):
+    """Events used to ask a worker to flush its partial results early, or to send its
+    results and exit so that it can be replaced by a fresh process."""
+
+    flush: Event
+    retire: Event
+
+
+def memory_usage(pid: int) -> Optional[int]:
+    """Return the memory usage of a process in bytes, or None if it is unavailable.
+
+    This uses the proportional set size (PSS) where available, so that memory a forked
+    worker still shares with the master process is not counted in full for every worker.
+    Otherwise, it falls back to the resident set size (RSS).
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+class MemoryMonitor:
+    """Samples the memory usage of the worker processes in a background thread, and
+    tries to keep their total below `memory_limit` bytes.
+
+    Each worker gets an equal share of the limit. Once a worker approaches its share, it
+    is asked to flush its partial results to the master process. If it is still above
+    its share after flushing, it is asked to retire so that it can be replaced by a
+    fresh process. While the total is above the limit, new items are only dispatched
+    when the workers have run out of work. The peak memory usage of each worker is kept
+    in `peak_memory`.
+    """
+
+    # The fraction of its share a worker may use before it is asked to flush.
+    HIGH_WATER = 0.9
+    # How often to sample the memory usage, in seconds.
+    INTERVAL = 0.5
+
+    def __init__(self, memory_limit: int, num_processes: int):
+        self.memory_limit = memory_limit
+        self.worker_limit = memory_limit / num_processes
+
+        self.peak_memory: Dict[int, int] = {}
+        self._workers: Dict[int, Process] = {}
+        self._controls: Dict[int, WorkerControl] = {}
+        self._flushed: Set[int] = set()
+        self._within_limit = True
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_worker(self, id: int, process: Process, control: WorkerControl):
+        """Start monitoring a (possibly replacement) worker process."""
+        with self._lock:
+            self._workers[id] = process
+            self._controls[id] = control
+            self._flushed.discard(id)
+
+    def start(self):
+        # Sample right away, since short loops may finish before the first interval.
+        self._sample()
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def throttle(self, in_queue: Queue):
+        """Block while the workers use too much memory, unless they have run out of
+        work."""
+        while not self._within_limit and not in_queue.empty():
+            if self._stopped.wait(self.INTERVAL):
+                return
+
+    def _monitor(self):
+        while not self._stopped.wait(self.INTERVAL):
+            self._sample()
+
+    def _sample(self):
+        total = 0
+        with self._lock:
+            for id, process in self._workers.items():
+                usage = memory_usage(process.pid) if process.is_alive() else None
+                if usage is None:
+                    continue
+
+                total += usage
+                self.peak_memory[id] = max(self.peak_memory.get(id, 0), usage)
+                if usage < self.HIGH_WATER * self.worker_limit:
+                    self._flushed.discard(id)
+                    continue
+
+                control = self._controls[id]
+                if control.flush.is_set() or control.retire.is_set():
+                    # Wait for the worker to respond to the previous request.
+                    continue
+                if id in self._flushed:
+                    control.retire.set()
+                else:
+                    control.flush.set()
+                    self._flushed.add(id)
+
+        self._within_limit = total <= self.memory_limit
@@ -1,19 +1,80 @@
+import collections
 import inspect
 import itertools
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future
 from multiprocessing import Process, Queue
-from typing import Callable, Dict, Iterable, Optional, Sequence
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Union
 
+import paraloop.affinity as affinity
 import paraloop.worker as worker
+from paraloop.cache import IterationCache
+from paraloop.checkpoint import Checkpoint
+from paraloop.memory import MemoryMonitor, WorkerControl
 from paraloop.syntax import LoopFinder, LoopTransformer
 from paraloop.variable import Variable
 
 
 class ParaLoop:
     """Wraps an iterable and executes its iterations in parallel over multiple
-    processes."""
+    processes.
+
+    If a `checkpoint` path is specified, the progress of the loop is saved to that path
+    roughly every `checkpoint_interval` seconds. Running the same loop again will then
+    skip the iterations that have already been completed, and aggregate the remaining
+    ones with the checkpointed results.
+
+    If a `cache` directory is specified, the effect of each iteration on the Variables
+    is stored in that directory, keyed on the loop body and the iteration item. Later
+    runs will replay unchanged iterations from the cache rather than executing them
+    again. The least recently used entries are evicted once the cache exceeds
+    `cache_size` bytes. Only use this if each iteration depends on nothing but its item.
+
+    To avoid oversubscribing the machine when the loop body calls natively threaded code
+    (e.g. numpy/BLAS), each worker limits such libraries to `threads_per_worker`
+    threads, which defaults to the number of available CPUs divided by the number of
+    processes. If `pin_cpus` is set, each worker is additionally pinned to its own
+    disjoint set of CPUs, grouped by NUMA node where possible.
+
+    If `block` is False, the loop returns immediately while the iterations are executed
+    in the background. Keep a reference to the ParaLoop and call its `wait()` method
+    before using the Variables modified by the loop, e.g.
+    ```
+    loop = ParaLoop(iterable, block=False)
+    for x in loop:
+        ...
+    do_something_else()
+    loop.wait()
+    ```
+
+    If a `memory_limit` (in bytes) is specified, the memory usage of the workers is
+    monitored. Workers that approach their share of the limit are asked to send their
+    partial results early, and are replaced by fresh processes if that doesn't help.
+    While the workers use more than the limit in total, no work is queued in advance.
+    The peak memory usage of each worker is available in `peak_memory` afterwards. Note
+    that the memory used by the master process to aggregate the results is not included.
+    If a worker is killed anyway, e.g. by the OOM killer, the loop raises an error.
+    """
+
+    # How often to check whether the workers are still alive while waiting for results.
+    LIVENESS_INTERVAL = 1.0
 
     def __init__(
-        self, iterable: Iterable, length: Optional[int] = None, num_processes: int = 8
+        self,
+        iterable: Iterable,
+        length: Optional[int] = None,
+        num_processes: int = 8,
+        checkpoint: Optional[Union[str, Path]] = None,
+        checkpoint_interval: float = 60.0,
+        cache: Optional[Union[str, Path]] = None,
+        cache_size: int = 2 ** 30,
+        threads_per_worker: Optional[int] = None,
+        pin_cpus: bool = False,
+        block: bool = True,
+        memory_limit: Optional[int] = None,
     ):
         self.iterable = iter(iterable)
         self.length = length
@@ -26,76 +87,345 @@ class ParaLoop:
                 "Paraloop must use at least two worker processes! "
                 f"The current configuration specifies only {num_processes}."
             )
+        self.checkpoint_path = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        if self.checkpoint_interval <= 0:
+            raise ValueError(
+                "The checkpoint interval must be positive! "
+                f"The current configuration specifies {checkpoint_interval}."
+            )
+        self.cache_directory = cache
+        self.cache_size = cache_size
+        self.threads_per_worker = threads_per_worker
+        if self.threads_per_worker is None:
+            self.threads_per_worker = affinity.default_num_threads(self.num_processes)
+        elif self.threads_per_worker < 1:
+            raise ValueError(
+                "Each worker must be allowed at least one thread! "
+                f"The current configuration specifies {threads_per_worker}."
+            )
+        self.pin_cpus = pin_cpus
+        if self.pin_cpus and not affinity.pinning_supported():
+            raise ValueError(
+                "Pinning workers to CPUs is not supported on this platform!"
+            )
+        self.block = block
+        self.memory_limit = memory_limit
+        if self.memory_limit is not None and self.memory_limit <= 0:
+            raise ValueError(
+                "The memory limit must be positive! "
+                f"The current configuration specifies {memory_limit}."
+            )
+
+        self.peak_memory: Dict[int, int] = {}
+        self._future: Optional[Future] = None
 
     def __iter__(self):
         # Find the source code of the calling loop and transform it into a function
         caller = inspect.stack()[1]
         loop_source = LoopFinder(caller.lineno, filename=caller.filename).find_loop()
-        function = LoopTransformer(
+        transformer = LoopTransformer(
             loop_source, caller.frame.f_globals, caller.frame.f_locals
-        ).build_loop_function()
+        )
+        function = transformer.build_loop_function()
 
-        # Keep track of the Variables that need to be aggregated properly
+        # Keep track of the Variables that need to be aggregated properly. Variables the
+        # loop doesn't modify don't need to be returned by the workers at all.
         variables = {
             key: value
             for key, value in itertools.chain(
-                caller.frame.f_locals.items(), caller.frame.f_globals.items()
+                caller.frame.f_globals.items(), caller.frame.f_locals.items()
             )
-            if isinstance(value, Variable)
+            if isinstance(value, Variable) and key in transformer.written_variables
         }
 
-        # Spawn process and distribute the work
-        processes, result_queue = self._distribute_work(function, variables)
-        # Wait for the results and aggregate them
-        self._process_results(processes, result_queue, variables)
+        # Resume from an earlier run if possible
+        checkpoint = None
+        if self.checkpoint_path is not None:
+            checkpoint = Checkpoint(self.checkpoint_path, loop_source)
+            checkpoint.load()
+            unknown = checkpoint.values.keys() - variables.keys()
+            if unknown:
+                raise ValueError(
+                    f"The checkpoint at {checkpoint.path} contains unknown Variables "
+                    f"{sorted(unknown)}! Remove it or specify a different checkpoint path."
+                )
+
+        cache = None
+        if self.cache_directory is not None:
+            cache = IterationCache(
+                self.cache_directory, transformer.fingerprint(), self.cache_size
+            )
+
+        # Spawn the processes from the calling thread, and let them do the work either
+        # in the foreground or in the background.
+        processes, spawn, in_queue, result_queue, monitor = self._start_workers(
+            function, variables, checkpoint, cache
+        )
+        self._future = Future()
+        args = (
+            processes,
+            spawn,
+            in_queue,
+            result_queue,
+            monitor,
+            variables,
+            checkpoint,
+            cache,
+        )
+        if not self.block:
+            threading.Thread(target=self._run, args=args, daemon=True).start()
+            return self
+
+        self._run(*args)
+        self.wait()
         return self
 
-    def _distribute_work(self, function: Callable, variables: Dict):
-        # Create queues to communicate with workers and spawn worker processes
-        in_queue, out_queue = (Queue(), Queue())
-        processes = []
-        for i in range(self.num_processes):
+    def done(self) -> bool:
+        """Check whether the loop has finished and its Variables have been
+        aggregated."""
+        return self._future is not None and self._future.done()
+
+    def wait(self, timeout: Optional[float] = None):
+        """Wait until the loop has finished and its Variables have been aggregated.
+
+        Any error that occurred in the meantime is raised again. Raises a
+        `concurrent.futures.TimeoutError` if the loop did not finish within `timeout`
+        seconds.
+        """
+        if self._future is None:
+            raise RuntimeError("This ParaLoop has not been started yet!")
+        self._future.result(timeout=timeout)
+
+    def _run(
+        self,
+        processes: List[Process],
+        spawn: Callable[[int], Process],
+        in_queue: Queue,
+        result_queue: Queue,
+        monitor: Optional[MemoryMonitor],
+        variables: Dict,
+        checkpoint: Optional[Checkpoint],
+        cache: Optional[IterationCache],
+    ):
+        """Distribute the work, aggregate the results and resolve the future."""
+        try:
+            # Distribute the work from a separate thread, so that we can process the
+            # results (and replace retired workers) in the meantime.
+            cache_hits: Deque[worker.Result] = collections.deque()
+            dispatcher = threading.Thread(
+                target=self._distribute_work,
+                args=(
+                    in_queue,
+                    result_queue,
+                    monitor,
+                    variables,
+                    checkpoint,
+                    cache,
+                    cache_hits,
+                ),
+                daemon=True,
+            )
+            dispatcher.start()
+            # Wait for the results and aggregate them
+            self._process_results(
+                processes, spawn, result_queue, variables, checkpoint, cache_hits
+            )
+            dispatcher.join()
+
+            if cache is not None:
+                cache.evict()
+        except Exception as e:
+            self._future.set_exception(e)
+        else:
+            self._future.set_result(None)
+        finally:
+            if monitor is not None:
+                monitor.stop()
+                self.peak_memory = dict(monitor.peak_memory)
+
+    def _start_workers(
+        self,
+        function: Callable,
+        variables: Dict,
+        checkpoint: Optional[Checkpoint],
+        cache: Optional[IterationCache],
+    ):
+        # Create queues to communicate with workers. When limiting memory, only a few
+        # items are queued in advance so that we can throttle the dispatching.
+        max_queued = 2 * self.num_processes if self.memory_limit is not None else 0
+        in_queue, out_queue = (Queue(max_queued), Queue())
+        flush_interval = self.checkpoint_interval if checkpoint is not None else None
+        cpu_sets = affinity.cpu_sets(self.num_processes) if self.pin_cpus else None
+        monitor = None
+        if self.memory_limit is not None:
+            monitor = MemoryMonitor(self.memory_limit, self.num_processes)
+
+        def spawn(i: int) -> Process:
+            control = None
+            if monitor is not None:
+                control = WorkerControl(
+                    multiprocessing.Event(), multiprocessing.Event()
+                )
             process = Process(
                 target=worker.create_worker,
                 args=(function, in_queue, out_queue, variables, i),
+                kwargs=dict(
+                    flush_interval=flush_interval,
+                    cache=cache,
+                    cpus=cpu_sets[i] if cpu_sets is not None else None,
+                    num_threads=self.threads_per_worker,
+                    control=control,
+                ),
                 name=f"worker_{i}",
             )
-            processes.append(process)
             process.start()
+            if monitor is not None:
+                monitor.add_worker(i, process, control)
+            return process
+
+        # Spawn the worker processes
+        processes = [spawn(i) for i in range(self.num_processes)]
+        if monitor is not None:
+            monitor.start()
 
-        # Distribute the work over the workers
-        for i, x in enumerate(self.iterable):
-            # TODO: after a certain amount, check how many jobs have been completed so
-            # we can display a progress bar.
-            in_queue.put((i, x))
+        return processes, spawn, in_queue, out_queue, monitor
 
-        # Signal them to stop once there are no more values to iterate over
-        for _ in processes:
-            in_queue.put((0, worker.Finished))
+    def _distribute_work(
+        self,
+        in_queue: Queue,
+        result_queue: Queue,
+        monitor: Optional[MemoryMonitor],
+        variables: Dict,
+        checkpoint: Optional[Checkpoint],
+        cache: Optional[IterationCache],
+        cache_hits: Deque[worker.Result],
+    ):
+        try:
+            # Distribute the work over the workers, replaying cached iterations directly
+            completed = checkpoint.completed if checkpoint is not None else set()
+            for i, x in enumerate(self.iterable):
+                # TODO: after a certain amount, check how many jobs have been completed
+                # so we can display a progress bar.
+                if i in completed:
+                    continue
+
+                key = None
+                if cache is not None:
+                    key = cache.key(x)
+                    deltas = cache.load(key)
+                    # Entries made with a different set of Variables can't be replayed
+                    if deltas is not None and deltas.keys() == variables.keys():
+                        values = {
+                            name: variable.aggregation_strategy.apply_delta(
+                                variable.wrapped, deltas[name]
+                            )
+                            for name, variable in variables.items()
+                        }
+                        cache_hits.append(worker.Result(-1, values, [i], final=False))
+                        continue
+
+                if monitor is not None:
+                    monitor.throttle(in_queue)
+                in_queue.put((i, x, key))
 
-        return processes, out_queue
+            # Signal them to stop once there are no more values to iterate over. Workers
+            # that retire early don't consume this, but their replacements do.
+            for _ in range(self.num_processes):
+                in_queue.put((0, worker.Finished, None))
+        except Exception as e:
+            # Pass the exception on to the thread processing the results.
+            result_queue.put(e)
 
     def _process_results(
-        self, processes: Sequence[Process], result_queue: Queue, variables: Dict
+        self,
+        processes: List[Process],
+        spawn: Callable[[int], Process],
+        result_queue: Queue,
+        variables: Dict,
+        checkpoint: Optional[Checkpoint],
+        cache_hits: Deque[worker.Result],
     ):
-        # Wait for the results
-        results = []
-        for _ in processes:
-            # TODO: add a timeout here in case one of the workers has crashed.
-            result = result_queue.get(block=True)
+        # Collect the values that still need to be aggregated for each Variable
+        pending: Dict[str, List[Any]] = {name: [] for name in variables}
+        if checkpoint is not None:
+            for name, value in checkpoint.values.items():
+                pending[name].append(value)
+
+        # Wait for the results, keeping track of the workers that haven't finished yet.
+        running = dict(enumerate(processes))
+        num_finished = 0
+        while num_finished < len(processes):
+            try:
+                result = result_queue.get(timeout=self.LIVENESS_INTERVAL)
+            except queue.Empty:
+                self._check_workers(running)
+                continue
             if isinstance(result, Exception):
                 print("An error has occured in one of the workers!")
                 raise result
 
-            results.append(result)
+            # Cached iterations are aggregated along with the worker results
+            while cache_hits:
+                self._collect(cache_hits.popleft(), pending, checkpoint)
+            self._collect(result, pending, checkpoint)
+            if result.final:
+                num_finished += 1
+                del running[result.worker_id]
+            if result.retired:
+                # Replace workers that exited early, e.g. to free up memory.
+                processes.append(spawn(result.worker_id))
+                running[result.worker_id] = processes[-1]
+
+            if checkpoint is not None or self.memory_limit is not None:
+                # Merge the partial results right away, so they can be persisted and
+                # don't pile up when workers flush or retire to save memory.
+                merged = self._aggregate(variables, pending)
+                pending = {name: [value] for name, value in merged.items()}
+                if checkpoint is not None:
+                    checkpoint.values = merged
+                    checkpoint.save()
 
-        # print(results)
+        while cache_hits:
+            self._collect(cache_hits.popleft(), pending, checkpoint)
+        for name, aggregated in self._aggregate(variables, pending).items():
+            variables[name].assign(aggregated)
 
-        for name, variable in variables.items():
-            aggregated = variable.aggregation_strategy.aggregate(
-                variable.wrapped, [result[name] for result in results]
+        if checkpoint is not None:
+            checkpoint.remove()
+
+    def _check_workers(self, running: Dict[int, Process]):
+        """Raise an error if a worker died before sending its final results, rather than
+        waiting for them forever."""
+        for id, process in running.items():
+            # Workers that exit normally send their results first, so a worker that
+            # exited cleanly may still have results on their way.
+            if process.exitcode not in (None, 0):
+                raise RuntimeError(
+                    f"Worker {id} exited unexpectedly with exit code {process.exitcode}"
+                    " (it may have been killed for using too much memory)!"
+                )
+
+    def _collect(
+        self,
+        result: worker.Result,
+        pending: Dict[str, List[Any]],
+        checkpoint: Optional[Checkpoint],
+    ):
+        """Add the values of a result to the pending values of each Variable."""
+        for name, value in result.values.items():
+            pending[name].append(value)
+        if checkpoint is not None:
+            checkpoint.completed.update(result.indices)
+
+    def _aggregate(self, variables: Dict, pending: Dict[str, List[Any]]):
+        """Aggregate the pending values of each Variable with its original value."""
+        return {
+            name: variable.aggregation_strategy.aggregate(
+                variable.wrapped, pending[name]
             )
-            variable.assign(aggregated)
+            for name, variable in variables.items()
+        }
 
     def __next__(self):
         # We already looped over the iterable ourselves, so we don't need to loop
@@ -1,8 +1,21 @@
 import ast
+import collections
+import datetime
+import functools
+import hashlib
+import inspect
 import itertools
+import operator
 import random
+import re
+import threading
+import types
+from numbers import Number
 from pathlib import Path
-from typing import Dict, List
+from types import CodeType
+from typing import Any, Dict, Iterator, List, Set
+
+import numpy as np
 
 from paraloop.variable import Variable
 
@@ -81,6 +94,12 @@ class LoopTransformer(ast.NodeTransformer):
         # This is used to distinguish the loop we're trying to convert from any inner
         # for loops that it may be wrapping.
         self._in_nested_for = False
+        self._function_node = None
+
+        # The Variables referenced by the loop, and the subset it may modify. These are
+        # determined when building the loop function.
+        self.read_variables: Set[str] = set()
+        self.written_variables: Set[str] = set()
 
     def build_loop_function(self):
         """Creates an executable function that will be called for each iteration in the
@@ -89,9 +108,15 @@ class LoopTransformer(ast.NodeTransformer):
         # print(ast.unparse(function_tree))
         # print(ast.dump(function_tree, indent=4))
 
-        function_name = function_tree.body[0].name
+        self._function_node = function_tree.body[0]
+        function_name = self._function_node.name
         assert function_name not in self.scope
 
+        usage = VariableUsage(self.scope, self.variable_names, function_tree)
+        usage.visit(function_tree)
+        self.read_variables = usage.read
+        self.written_variables = usage.written
+
         # Parse the string and insert it into the scope
         function = compile(function_tree, filename="<wrapped_loop>", mode="exec")
         exec(function, self.scope)
@@ -100,6 +125,20 @@ class LoopTransformer(ast.NodeTransformer):
         function = self.scope[function_name]
         return function
 
+    def fingerprint(self) -> str:
+        """Returns a hash of the transformed loop function that only changes when the
+        body or target of the loop changes.
+
+        The randomly generated function name and line numbers are excluded, so moving
+        the loop around in its file does not change the fingerprint.
+        """
+        if self._function_node is None:
+            raise RuntimeError("The loop function has not been built yet!")
+
+        dumped = [ast.dump(self._function_node.args)]
+        dumped.extend(ast.dump(statement) for statement in self._function_node.body)
+        return hashlib.sha256("\n".join(dumped).encode()).hexdigest()
+
     def visit_For(self, node: ast.For):
         """Converts the for-loop into a function with a random name."""
         # We only convert the outermost for-loop.
@@ -195,3 +234,273 @@ class LoopTransformer(ast.NodeTransformer):
         new_node = ast.Return(value=ast.Constant(value=None))
         ast.fix_missing_locations(new_node)
         return new_node
+
+
+class VariableUsage(ast.NodeVisitor):
+    """Statically determines which paraloop Variables are read and which may be written
+    by a (transformed) loop function.
+
+    This is conservative: a Variable only counts as read-only if every reference to it
+    is in a context that can't modify it, e.g. as an operand or inside `len()`. Any
+    other use, such as calling one of its methods or passing it to a function, counts as
+    a write. Any Variable that can be reached from an object the loop refers to, e.g. a
+    helper function that appends to a global Variable, a method or a list of Variables,
+    also counts as a write. If the loop refers to an object that can't be inspected,
+    every Variable counts as written.
+    """
+
+    # Builtins that never modify their arguments.
+    SAFE_CALLS = set(
+        [
+            "abs",
+            "bool",
+            "float",
+            "int",
+            "isinstance",
+            "len",
+            "print",
+            "repr",
+            "round",
+            "str",
+        ]
+    )
+
+    # Objects that can't refer to any Variables.
+    ATOMIC_TYPES = (
+        type(None),
+        type(Ellipsis),
+        Number,
+        str,
+        bytes,
+        bytearray,
+        range,
+        slice,
+        types.ModuleType,
+        datetime.date,
+        datetime.time,
+        datetime.timedelta,
+        datetime.tzinfo,
+        re.Pattern,
+        operator.attrgetter,
+        operator.itemgetter,
+        operator.methodcaller,
+        type(threading.Lock()),
+        type(threading.RLock()),
+        np.generic,
+        np.dtype,
+        np.ufunc,
+        np.random.Generator,
+        np.random.BitGenerator,
+        np.random.RandomState,
+        # Descriptors of builtin types
+        types.WrapperDescriptorType,
+        types.MethodDescriptorType,
+        types.ClassMethodDescriptorType,
+        types.GetSetDescriptorType,
+        types.MemberDescriptorType,
+    )
+    CONTAINER_TYPES = (list, tuple, set, frozenset, collections.deque)
+    # Containers implemented in C that don't refer to anything but their contents.
+    BUILTIN_CONTAINER_TYPES = (
+        list,
+        tuple,
+        set,
+        frozenset,
+        dict,
+        collections.deque,
+        collections.OrderedDict,
+        collections.defaultdict,
+    )
+
+    def __init__(self, scope: Dict, variable_names: Set[str], tree: ast.AST):
+        self.scope = scope
+        self.variable_names = variable_names
+        self.parents = {
+            child: node
+            for node in ast.walk(tree)
+            for child in ast.iter_child_nodes(node)
+        }
+        # Used to recognize our Variables when they are referred to by other objects.
+        self.variable_ids = {id(scope[name]): name for name in variable_names}
+
+        self.read: Set[str] = set()
+        self.written: Set[str] = set()
+        self._visited_objects: Set[int] = set()
+        self._keep_alive: List[Any] = []
+
+    def visit_Name(self, node: ast.Name):
+        if node.id not in self.variable_names:
+            self._visit_object(self.scope.get(node.id))
+            return
+
+        self.read.add(node.id)
+        if not isinstance(node.ctx, ast.Load) or not self._is_read_only(node):
+            self.written.add(node.id)
+
+    def visit_Attribute(self, node: ast.Attribute):
+        # Functions can also be referred to through their module, e.g. `module.f(x)`.
+        if isinstance(node.value, ast.Name):
+            module = self.scope.get(node.value.id)
+            if inspect.ismodule(module):
+                self._visit_object(getattr(module, node.attr, None))
+        self.generic_visit(node)
+
+    def _visit_object(self, value: Any):
+        """Mark Variables that can be reached from an object in the scope of the loop as
+        written, since we can't tell how that object uses them."""
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if id(value) in self._visited_objects or isinstance(
+                value, self.ATOMIC_TYPES
+            ):
+                continue
+            # Keep the object alive, so its id can't be reused during the analysis.
+            self._visited_objects.add(id(value))
+            self._keep_alive.append(value)
+
+            referents = self._referents(value)
+            if referents is None:
+                # We can't tell which Variables this object refers to, so assume all.
+                self.read.update(self.variable_names)
+                self.written.update(self.variable_names)
+                return
+            stack.extend(referents)
+
+    def _referents(self, value: Any) -> Any:
+        """Return the objects through which an object may use Variables, or None if this
+        can't be determined."""
+        if isinstance(value, Variable):
+            if id(value) in self.variable_ids:
+                name = self.variable_ids[id(value)]
+                self.read.add(name)
+                self.written.add(name)
+            return []
+
+        if inspect.isfunction(value):
+            # Follow the globals and closure variables of the function.
+            referents = [
+                value.__globals__[name]
+                for name in self._code_names(value.__code__)
+                if name in value.__globals__
+            ]
+            for cell in value.__closure__ or ():
+                try:
+                    referents.append(cell.cell_contents)
+                except ValueError:
+                    # The cell is still empty.
+                    pass
+            referents.extend(value.__defaults__ or ())
+            referents.extend((value.__kwdefaults__ or {}).values())
+            return referents
+        if isinstance(value, (types.MethodType, types.BuiltinMethodType)):
+            # Bound methods, including those of builtin objects, e.g. `items.append`
+            return [getattr(value, "__func__", None), value.__self__]
+        if isinstance(value, types.MethodWrapperType):
+            return [value.__self__]
+        if isinstance(value, (staticmethod, classmethod)):
+            return [value.__func__]
+        if isinstance(value, property):
+            return [value.fget, value.fset, value.fdel]
+        if isinstance(value, functools.partial):
+            return [value.func, *value.args, *value.keywords.values()]
+        if inspect.isclass(value):
+            return self._class_referents(value)
+
+        if isinstance(value, np.ndarray):
+            return None if value.dtype.hasobject else []
+        cls = type(value)
+        if isinstance(value, self.CONTAINER_TYPES):
+            referents = list(value)
+        elif isinstance(value, dict):
+            referents = [*value.keys(), *value.values()]
+            if isinstance(value, collections.defaultdict):
+                referents.append(value.default_factory)
+        elif cls is object:
+            return []
+        elif cls.__module__ == "builtins":
+            # E.g. iterators, which may hold on to anything.
+            return None
+        else:
+            referents = []
+        if cls in self.BUILTIN_CONTAINER_TYPES:
+            return referents
+
+        # Instances may use Variables through their attributes and methods.
+        referents.append(cls)
+        if hasattr(value, "__dict__"):
+            referents.extend(vars(value).values())
+        else:
+            slots = self._slots(cls)
+            if slots is None:
+                return None
+            referents.extend(getattr(value, slot, None) for slot in slots)
+        return referents
+
+    def _class_referents(self, cls: type) -> List[Any]:
+        """Return the methods and class attributes of a Python class."""
+        referents = []
+        for base in inspect.getmro(cls):
+            if base.__module__ == "builtins":
+                continue
+            for name, attribute in vars(base).items():
+                # Skip the bookkeeping attributes of Python itself and `abc`, e.g.
+                # `__annotations__`, but not special methods such as `__init__`.
+                special = name.startswith("__") and name.endswith("__")
+                if name.startswith("_abc_") or (
+                    special
+                    and not callable(attribute)
+                    and not isinstance(attribute, (staticmethod, classmethod, property))
+                ):
+                    continue
+                referents.append(attribute)
+        return referents
+
+    def _slots(self, cls: type) -> Any:
+        """Return the names of the slots of a Python class, or None if it (or one of its
+        bases) is implemented in C."""
+        slots = []
+        for base in inspect.getmro(cls):
+            if base is object:
+                continue
+            if "__slots__" not in vars(base):
+                return None
+            names = vars(base)["__slots__"]
+            names = [names] if isinstance(names, str) else names
+            slots.extend(
+                name for name in names if name not in ("__dict__", "__weakref__")
+            )
+        return slots
+
+    def _code_names(self, code: CodeType) -> Iterator[str]:
+        """Yield the global names used by a code object, including nested functions and
+        comprehensions."""
+        yield from code.co_names
+        for constant in code.co_consts:
+            if isinstance(constant, CodeType):
+                yield from self._code_names(constant)
+
+    def _is_read_only(self, node: ast.AST) -> bool:
+        """Check whether the value of this expression can't be modified by the context
+        in which it is used."""
+        parent = self.parents.get(node)
+        if isinstance(
+            parent,
+            (ast.BinOp, ast.BoolOp, ast.Compare, ast.FormattedValue, ast.UnaryOp),
+        ):
+            return True
+        if isinstance(parent, (ast.Assert, ast.If, ast.IfExp, ast.While)):
+            return node is parent.test
+        if isinstance(parent, ast.Call):
+            return (
+                any(argument is node for argument in parent.args)
+                and isinstance(parent.func, ast.Name)
+                and parent.func.id in self.SAFE_CALLS
+            )
+        if isinstance(parent, ast.Subscript) and node is not parent.value:
+            # Used as an index into another object
+            return True
+        if isinstance(parent, (ast.Attribute, ast.Subscript)):
+            # E.g. `variable[key]` is read-only if the resulting value is.
+            return isinstance(parent.ctx, ast.Load) and self._is_read_only(parent)
+        return False
@@ -1,5 +1,12 @@
+import copy
+import queue
+import time
 from multiprocessing import Queue
-from typing import Callable, Dict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import paraloop.affinity as affinity
+from paraloop.cache import IterationCache
+from paraloop.memory import WorkerControl
 
 
 class Finished:
@@ -8,13 +15,44 @@ class Finished:
     pass
 
 
+class Result(NamedTuple):
+    """Results sent from a worker to the master process.
+
+    `values` maps the name of each Variable to its wrapped value, `indices` contains the
+    iterations that contributed to these values (only tracked when checkpointing) and
+    `final` indicates whether this is the last result the worker will send. A worker
+    that exits before receiving `Finished` sets `retired`, so that it can be replaced.
+    """
+
+    worker_id: int
+    values: Dict[str, Any]
+    indices: List[int]
+    final: bool
+    retired: bool = False
+
+
 class Worker:
     """Worker process used to execute the loop iterations assigned to it.
 
     Inputs and results are communicated through the specified Queues. Any exceptions
-    will be passed to the master process.
+    will be passed to the master process. If a `flush_interval` is specified, the worker
+    sends its partial results to the master process every `flush_interval` seconds and
+    resets its Variables to their initial values afterwards.
+
+    If a `cache` is specified, every iteration is executed starting from the initial
+    values of the Variables, so that its change to them can be stored in the cache. The results
+    of the individual iterations are then aggregated by the worker itself.
+
+    The worker can be pinned to a set of `cpus`, and the number of threads used by
+    natively threaded libraries can be limited to `num_threads`.
+
+    If a `control` is specified, the master process can ask the worker to flush its
+    partial results early, or to send its results and exit, e.g. to reduce memory usage.
     """
 
+    # How often to check for requests of the master process while waiting for work.
+    REQUEST_INTERVAL = 0.1
+
     def __init__(
         self,
         function: Callable,
@@ -22,35 +60,180 @@ class Worker:
         out_queue: Queue,
         variables: Dict,
         id: int,
+        flush_interval: Optional[float] = None,
+        cache: Optional[IterationCache] = None,
+        cpus: Optional[Sequence[int]] = None,
+        num_threads: Optional[int] = None,
+        control: Optional[WorkerControl] = None,
     ):
         self.function = function
         self.in_queue = in_queue
         self.out_queue = out_queue
         self.variables = variables
         self.id = id
+        self.flush_interval = flush_interval
+        self.cache = cache
+        self.cpus = cpus
+        self.num_threads = num_threads
+        self.control = control
 
         self.done = False
+        self.completed: List[int] = []
+        # Whether the Variables may have changed since they were last reset.
+        self._changed = False
+        self._last_flush = time.monotonic()
+        self._accumulated: Optional[Dict[str, Any]] = None
+        # Keep a copy of the initial values only if we need to reset the Variables, i.e.
+        # after every flush or cached iteration, since it may be large.
+        self._original_values: Optional[Dict[str, Any]] = None
+        if flush_interval is not None or cache is not None:
+            self._original_values = copy.deepcopy(self._variable_values())
+        # This is all we need to encode the results relative to the initial values.
+        self._snapshots = {
+            name: variable.aggregation_strategy.snapshot(variable.wrapped)
+            for name, variable in self.variables.items()
+        }
 
     def start(self):
+        self._thread_limits = affinity.configure(self.cpus, self.num_threads)
         while not self.done:
             try:
+                if self._handle_requests():
+                    return
+
                 # TODO: we probably want to cache a few items at a time so we don't need to
                 # wait for the queue lock.
-                index, args = self.in_queue.get()
+                try:
+                    # Don't block forever if we may have to respond to requests.
+                    timeout = None if self.control is None else self.REQUEST_INTERVAL
+                    index, args, key = self.in_queue.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+
                 if args is Finished:
-                    self.out_queue.put(self.variables)
+                    self._send_results(final=True)
                     self.done = True
                     return
 
-                if isinstance(args, (list, tuple)):
-                    self.function(*args)
+                if self.cache is not None:
+                    self._run_cached(args, key)
                 else:
-                    self.function(args)
+                    self._run(args)
+                self._changed = True
+
+                if self.flush_interval is not None:
+                    self.completed.append(index)
+                    if time.monotonic() - self._last_flush >= self.flush_interval:
+                        self._flush()
             except Exception as e:
                 # Pass exception on to the master process.
                 self.out_queue.put(e)
                 return
 
+    def _handle_requests(self) -> bool:
+        """Respond to requests of the master process, returning whether the worker
+        should exit."""
+        if self.control is None:
+            return False
+
+        # The master process may set these at any time, so only check them once.
+        flush = self.control.flush.is_set()
+        retire = self.control.retire.is_set()
+        if (flush or retire) and not self._changed:
+            # We can't free any memory by flushing or retiring, e.g. if this worker
+            # has only just been started.
+            self.control.flush.clear()
+            self.control.retire.clear()
+            return False
+
+        # Without a copy of the initial values we can't reset the Variables after a
+        # flush, but a replacement worker starts from them.
+        if retire or (flush and self._original_values is None):
+            self._send_results(final=True, retired=True)
+            self.done = True
+            return True
+
+        if flush:
+            self._flush()
+            self.control.flush.clear()
+        return False
+
+    def _run(self, args: Any):
+        if isinstance(args, (list, tuple)):
+            self.function(*args)
+        else:
+            self.function(args)
+
+    def _run_cached(self, args: Any, key: str):
+        """Run the iteration in isolation, store its effect in the cache and aggregate
+        it with the results of the previous iterations."""
+        self._reset_variables()
+        self._run(args)
+        values = self._variable_values()
+        # Only store the change, so it can be replayed on top of other initial values.
+        self.cache.store(
+            key,
+            {
+                name: variable.aggregation_strategy.delta(
+                    self._original_values[name], values[name]
+                )
+                for name, variable in self.variables.items()
+            },
+        )
+
+        if self._accumulated is None:
+            self._accumulated = values
+            return
+
+        self._accumulated = {
+            name: variable.aggregation_strategy.aggregate(
+                self._original_values[name], [self._accumulated[name], values[name]]
+            )
+            for name, variable in self.variables.items()
+        }
+
+    def _variable_values(self) -> Dict[str, Any]:
+        return {name: variable.wrapped for name, variable in self.variables.items()}
+
+    def _reset_variables(self):
+        # The queue pickles its items in a background thread, so we must not modify
+        # objects that may have just been sent. Assigning fresh copies leaves those
+        # untouched.
+        initial_values = copy.deepcopy(self._original_values)
+        for name, variable in self.variables.items():
+            variable.assign(initial_values[name])
+
+    def _send_results(self, final: bool, retired: bool = False):
+        if self.cache is None:
+            values = self._variable_values()
+        elif self._accumulated is None:
+            values = copy.deepcopy(self._original_values)
+        else:
+            values = self._accumulated
+
+        # Let the aggregation strategies reduce the size of the results, e.g. by only
+        # sending back the changed elements of an array.
+        encoded = {
+            name: values[name]
+            if self._snapshots[name] is None
+            else variable.aggregation_strategy.encode(
+                self._snapshots[name], values[name]
+            )
+            for name, variable in self.variables.items()
+        }
+        self.out_queue.put(Result(self.id, encoded, self.completed, final, retired))
+
+    def _flush(self):
+        """Send the partial results to the master process and start over from the
+        initial values."""
+        self._send_results(final=False)
+        if self.cache is None:
+            self._reset_variables()
+        self._accumulated = None
+        self._changed = False
+        self.completed = []
+        self._last_flush = time.monotonic()
+
 
 def create_worker(*args, **kwargs):
     worker = Worker(*args, **kwargs)
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+from threadpoolctl import threadpool_info
+
+from paraloop import ParaLoop, affinity
+
+
+class TestAffinity:
+    def test_parse_cpulist(self):
+        assert affinity._parse_cpulist("0-3,8,10-11") == [0, 1, 2, 3, 8, 10, 11]
+        assert affinity._parse_cpulist("") == []
+
+    def test_cpu_sets(self, monkeypatch):
+        monkeypatch.setattr(affinity, "available_cpus", lambda: list(range(8)))
+        assert affinity.cpu_sets(3) == [[0, 1], [2, 3, 4], [5, 6, 7]]
+        assert affinity.cpu_sets(8) == [[i] for i in range(8)]
+
+        # Fewer CPUs than processes
+        monkeypatch.setattr(affinity, "available_cpus", lambda: [0, 1])
+        assert affinity.cpu_sets(3) == [[0], [1], [0]]
+
+    def test_numa_order(self, monkeypatch):
+        monkeypatch.setattr(os, "sched_getaffinity", lambda pid: {0, 1, 2, 3})
+        monkeypatch.setattr(affinity, "_numa_nodes", lambda: {0: 0, 1: 1, 2: 0, 3: 1})
+        assert affinity.available_cpus() == [0, 2, 1, 3]
+
+    def test_default_num_threads(self, monkeypatch):
+        monkeypatch.setattr(affinity, "available_cpus", lambda: list(range(16)))
+        assert affinity.default_num_threads(4) == 4
+        assert affinity.default_num_threads(32) == 1
+
+    def test_unsupported_platform(self, monkeypatch):
+        monkeypatch.delattr(os, "sched_getaffinity")
+        monkeypatch.setattr(os, "cpu_count", lambda: 4)
+        assert not affinity.pinning_supported()
+        assert affinity.available_cpus() == [0, 1, 2, 3]
+
+        assert ParaLoop(range(10), num_processes=2).threads_per_worker == 2
+        with pytest.raises(ValueError, match="not supported"):
+            ParaLoop(range(10), num_processes=2, pin_cpus=True)
+
+    def test_limit_threads(self, monkeypatch):
+        for variable in affinity.THREAD_VARIABLES:
+            monkeypatch.delenv(variable, raising=False)
+
+        limits = affinity.limit_threads(1)
+        try:
+            assert os.environ["OPENBLAS_NUM_THREADS"] == "1"
+            assert all(info["num_threads"] == 1 for info in threadpool_info())
+        finally:
+            limits.restore_original_limits()
@@ -1,7 +1,7 @@
 import numpy as np
 import pytest
 
-from paraloop.aggregation_strategies import Concatenate, Sum
+from paraloop.aggregation_strategies import ChangedBlocks, Concatenate, SparseDelta, Sum
 
 
 class TestSum:
@@ -31,6 +31,38 @@ class TestSum:
             == [2, 4, 6, 8, 10]
         )
 
+    def test_sparse(self):
+        original = np.ones((100, 1000))
+        first, second = original.copy(), original.copy()
+        first[3, 4] += 2
+        second[3, 4] += 1.5
+        second[50] += 1
+
+        # Only the changed blocks are encoded, based on a snapshot of the original.
+        snapshot = Sum.snapshot(original)
+        encoded = [Sum.encode(snapshot, first), Sum.encode(snapshot, second)]
+        assert all(isinstance(blocks, ChangedBlocks) for blocks in encoded)
+        assert list(encoded[1].blocks) == [0, 6]
+        assert encoded[1].values.size == 2 * encoded[1].block_size
+
+        # Deltas only contain the changed elements.
+        deltas = [Sum.delta(original, first), Sum.delta(original, second)]
+        assert all(isinstance(delta, SparseDelta) for delta in deltas)
+        assert np.all(deltas[1].indices == [3004] + list(range(50000, 51000)))
+
+        expected = Sum.aggregate(original, [first, second])
+        assert np.all(Sum.aggregate(original, encoded) == expected)
+        assert np.all(Sum.aggregate(original, deltas) == expected)
+        # Mixing sparse and dense results
+        assert np.all(Sum.aggregate(original, [encoded[0], second]) == expected)
+        assert np.all(Sum.aggregate(original, [deltas[0], encoded[1]]) == expected)
+
+        # Dense updates are sent as is
+        assert isinstance(Sum.encode(snapshot, original + 1), np.ndarray)
+        assert isinstance(Sum.delta(original, original + 1), np.ndarray)
+        assert Sum.snapshot(5) is None
+        assert Sum.delta(5, 7) == 2
+
 
 class TestConcatenate:
     def test_compatible(self):
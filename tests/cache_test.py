@@ -0,0 +1,81 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from paraloop import ParaLoop, Variable
+from paraloop.aggregation_strategies import Concatenate, SparseDelta, Sum
+from paraloop.cache import IterationCache
+
+fail = False
+
+
+def run_loop(cache_directory, start=0):
+    total = Variable(start, aggregation_strategy=Sum)
+    counts = Variable(np.full(1000, start), aggregation_strategy=Sum)
+    squares = Variable({}, aggregation_strategy=Concatenate)
+    for i in ParaLoop(range(20), num_processes=2, cache=cache_directory):
+        if fail:
+            raise RuntimeError("This iteration should have been replayed!")
+        total += i
+        counts[i] += 1
+        squares[i] = i ** 2
+    return total, counts, squares
+
+
+class TestIterationCache:
+    def test_store_load(self, tmp_path):
+        cache = IterationCache(tmp_path, "fingerprint")
+        key = cache.key(("item", 1))
+        assert key == cache.key(("item", 1))
+        assert key != cache.key(("item", 2))
+        assert key != IterationCache(tmp_path, "other").key(("item", 1))
+
+        assert cache.load(key) is None
+        cache.store(key, {"total": 3})
+        assert cache.load(key) == {"total": 3}
+
+    def test_evict(self, tmp_path):
+        cache = IterationCache(tmp_path, "fingerprint", max_size=1)
+        keys = [cache.key(i) for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.store(key, {"total": 3})
+            os.utime(tmp_path / f"{key}.pkl", (i, i))
+        entry_size = (tmp_path / f"{keys[0]}.pkl").stat().st_size
+
+        cache.max_size = 2 * entry_size
+        # Make the first entry the most recently used one.
+        cache.load(keys[0])
+        cache.evict()
+        assert cache.load(keys[0]) is not None
+        assert cache.load(keys[1]) is None
+        assert cache.load(keys[2]) is not None
+
+    def test_replay(self, tmp_path, monkeypatch):
+        total, counts, squares = run_loop(tmp_path)
+        assert total == sum(range(20))
+        assert counts.wrapped.sum() == 20
+        assert squares.wrapped == {i: i ** 2 for i in range(20)}
+
+        # Only the changes are stored, sparsely in case of numpy arrays.
+        entries = list(tmp_path.glob("*.pkl"))
+        assert len(entries) == 20
+        with open(entries[0], "rb") as f:
+            entry = pickle.load(f)
+        assert entry["total"] in range(20)
+        assert isinstance(entry["counts"], SparseDelta)
+
+        # All iterations are replayed from the cache, so the loop body never runs, and
+        # the cached changes are applied to the new initial values.
+        monkeypatch.setitem(globals(), "fail", True)
+        total, counts, squares = run_loop(tmp_path, start=100)
+        assert total == 100 + sum(range(20))
+        expected = np.full(1000, 100)
+        expected[:20] += 1
+        assert np.all(counts.wrapped == expected)
+        assert squares.wrapped == {i: i ** 2 for i in range(20)}
+
+    def test_invalid_size(self, tmp_path):
+        with pytest.raises(ValueError, match="positive"):
+            IterationCache(tmp_path, "fingerprint", max_size=0)
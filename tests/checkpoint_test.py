@@ -0,0 +1,73 @@
+import multiprocessing
+import pickle
+
+import pytest
+
+from paraloop import ParaLoop, Variable
+from paraloop.aggregation_strategies import Concatenate, Sum
+from paraloop.checkpoint import Checkpoint
+
+# Counts how often the loop body is executed, across all worker processes.
+executions = multiprocessing.Value("i", 0)
+
+
+def run_loop(checkpoint_path, fail_at=None):
+    total = Variable(0, aggregation_strategy=Sum)
+    seen = Variable([], aggregation_strategy=Concatenate)
+    for i in ParaLoop(
+        range(100),
+        num_processes=2,
+        checkpoint=checkpoint_path,
+        checkpoint_interval=1e-6,
+    ):
+        with executions.get_lock():
+            executions.value += 1
+        if i == fail_at:
+            raise RuntimeError("Pre-empted!")
+        total += i
+        seen.append(i)
+    return total, seen
+
+
+class TestCheckpoint:
+    def test_save_load(self, tmp_path):
+        path = tmp_path / "checkpoint.pkl"
+        checkpoint = Checkpoint(path, "for i in range(10): pass")
+        assert not checkpoint.load()
+
+        checkpoint.completed = {0, 1, 2}
+        checkpoint.values = {"total": 3}
+        checkpoint.save()
+
+        loaded = Checkpoint(path, "for i in range(10): pass")
+        assert loaded.load()
+        assert loaded.completed == {0, 1, 2}
+        assert loaded.values == {"total": 3}
+
+        with pytest.raises(ValueError, match="different loop"):
+            Checkpoint(path, "for j in range(10): pass").load()
+
+        loaded.remove()
+        assert not path.exists()
+
+    def test_resume(self, tmp_path):
+        path = tmp_path / "checkpoint.pkl"
+        with pytest.raises(RuntimeError, match="Pre-empted"):
+            run_loop(path, fail_at=50)
+        assert path.exists()
+
+        with open(path, "rb") as f:
+            completed = pickle.load(f)["completed"]
+        assert len(completed) > 0
+
+        # The other worker may still be running the remaining iterations.
+        for process in multiprocessing.active_children():
+            process.join()
+
+        # Only the iterations that weren't completed are executed again.
+        executions.value = 0
+        total, seen = run_loop(path)
+        assert executions.value == 100 - len(completed)
+        assert total == sum(range(100))
+        assert sorted(seen) == list(range(100))
+        assert not path.exists()
@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import signal
+
+import pytest
+
+from paraloop import ParaLoop, Variable, memory
+from paraloop.aggregation_strategies import Concatenate, Sum
+from paraloop.memory import MemoryMonitor, WorkerControl
+from paraloop.worker import Finished, Worker
+
+
+class FakeProcess:
+    def __init__(self, pid: int):
+        self.pid = pid
+
+    def is_alive(self):
+        return True
+
+
+class TestMemoryMonitor:
+    def test_memory_usage(self):
+        assert memory.memory_usage(os.getpid()) > 0
+
+    def test_sample(self, monkeypatch):
+        usage = {0: 100, 1: 950}
+        monkeypatch.setattr(memory, "memory_usage", lambda pid: usage[pid])
+
+        monitor = MemoryMonitor(2000, num_processes=2)
+        controls = []
+        for i in range(2):
+            controls.append(
+                WorkerControl(multiprocessing.Event(), multiprocessing.Event())
+            )
+            monitor.add_worker(i, FakeProcess(i), controls[i])
+
+        # Worker 1 approaches its share, so it is asked to flush.
+        monitor._sample()
+        assert not controls[0].flush.is_set()
+        assert controls[1].flush.is_set()
+        assert monitor._within_limit
+
+        # It is still above its share after flushing, so it is asked to retire.
+        controls[1].flush.clear()
+        usage[1] = 2000
+        monitor._sample()
+        assert not controls[1].flush.is_set()
+        assert controls[1].retire.is_set()
+        assert not monitor._within_limit
+        assert monitor.peak_memory == {0: 100, 1: 2000}
+
+    def test_recycle(self, monkeypatch):
+        # Every worker exceeds a 1 byte limit, so they are continuously replaced.
+        monkeypatch.setattr(MemoryMonitor, "INTERVAL", 0.01)
+        # The partial results are merged as soon as they arrive.
+        num_pending = []
+        aggregate = ParaLoop._aggregate
+
+        def counting_aggregate(self, variables, pending):
+            num_pending.append(max(len(values) for values in pending.values()))
+            return aggregate(self, variables, pending)
+
+        monkeypatch.setattr(ParaLoop, "_aggregate", counting_aggregate)
+        total = Variable(0, aggregation_strategy=Sum)
+        seen = Variable([], aggregation_strategy=Concatenate)
+        loop = ParaLoop(range(200), num_processes=2, memory_limit=1)
+        for i in loop:
+            total += i
+            seen.append(i)
+
+        assert total == sum(range(200))
+        assert sorted(seen) == list(range(200))
+        assert set(loop.peak_memory.keys()) <= {0, 1}
+        assert max(num_pending) <= 2
+
+    def test_short_loop(self):
+        # The memory usage is sampled right away, even if the loop is done before the
+        # first interval.
+        total = Variable(0, aggregation_strategy=Sum)
+        loop = ParaLoop(range(10), num_processes=2, memory_limit=2 ** 40)
+        for i in loop:
+            total += i
+
+        assert total == sum(range(10))
+        assert set(loop.peak_memory.keys()) == {0, 1}
+        assert all(usage > 0 for usage in loop.peak_memory.values())
+
+    def test_fresh_worker(self):
+        # A worker that hasn't run any iterations can't free memory, so it ignores
+        # requests to retire.
+        total = Variable(0, aggregation_strategy=Sum)
+        in_queue, out_queue = multiprocessing.Queue(), multiprocessing.Queue()
+        control = WorkerControl(multiprocessing.Event(), multiprocessing.Event())
+        control.retire.set()
+        in_queue.put((0, 5, None))
+        in_queue.put((0, Finished, None))
+
+        def add(x):
+            total.assign(total.wrapped + x)
+
+        Worker(add, in_queue, out_queue, {"total": total}, 0, control=control).start()
+        result = out_queue.get(timeout=5)
+        assert result.values == {"total": 5}
+        assert result.final and not result.retired
+        assert not control.retire.is_set()
+
+    def test_killed_worker(self, monkeypatch):
+        # A worker that is killed, e.g. by the OOM killer, fails the loop.
+        monkeypatch.setattr(ParaLoop, "LIVENESS_INTERVAL", 0.1)
+        with pytest.raises(RuntimeError, match="exited unexpectedly"):
+            for i in ParaLoop(range(10), num_processes=2, memory_limit=2 ** 40):
+                if i == 5:
+                    os.kill(os.getpid(), signal.SIGKILL)
@@ -0,0 +1,106 @@
+import functools
+
+import numpy as np
+import pytest
+
+from paraloop import ParaLoop, Variable
+from paraloop.aggregation_strategies import ChangedBlocks, Concatenate, Sum
+
+recorded = Variable([], aggregation_strategy=Concatenate)
+
+
+def record(x):
+    recorded.append(x)
+
+
+class Recorder:
+    def __init__(self, x=None):
+        if x is not None:
+            self.add(x)
+
+    def add(self, x):
+        record(x)
+
+
+class TestVariables:
+    def test_helper_function(self):
+        # The loop only modifies `recorded` through a helper function.
+        recorded.assign([])
+        for i in ParaLoop(range(10), num_processes=2):
+            record(i)
+
+        assert sorted(recorded) == list(range(10))
+
+    def test_objects(self):
+        # The loop modifies `recorded` through a method, a class, a partial function
+        # and a container.
+        recorder = Recorder()
+        recorded.assign([])
+        for i in ParaLoop(range(10), num_processes=2):
+            recorder.add(i)
+        assert sorted(recorded) == list(range(10))
+
+        recorded.assign([])
+        for i in ParaLoop(range(10), num_processes=2):
+            Recorder(i)
+        assert sorted(recorded) == list(range(10))
+
+        record_partial = functools.partial(record)
+        recorded.assign([])
+        for i in ParaLoop(range(10), num_processes=2):
+            record_partial(i)
+        assert sorted(recorded) == list(range(10))
+
+        variables = [recorded]
+        recorded.assign([])
+        for i in ParaLoop(range(10), num_processes=2):
+            variables[0].append(i)
+        assert sorted(recorded) == list(range(10))
+
+    def test_sparse_array(self, monkeypatch):
+        # Record the results the workers send back.
+        received = []
+        aggregate = Sum.aggregate
+
+        def recording_aggregate(original, new_values):
+            received.extend(new_values)
+            return aggregate(original, new_values)
+
+        monkeypatch.setattr(Sum, "aggregate", recording_aggregate)
+        counts = Variable(np.zeros(10 ** 6), aggregation_strategy=Sum)
+        for i in ParaLoop(range(100), num_processes=2):
+            counts[i * 1000] += 1
+
+        expected = np.zeros(10 ** 6)
+        expected[::1000][:100] = 1
+        assert np.all(counts.wrapped == expected)
+
+        # Only the changed blocks of the array are sent back.
+        assert len(received) == 2
+        assert all(isinstance(value, ChangedBlocks) for value in received)
+        assert sum(value.values.size for value in received) < 10 ** 6 // 2
+
+
+class TestNonBlocking:
+    def test_wait(self):
+        total = Variable(0, aggregation_strategy=Sum)
+        loop = ParaLoop(range(100), num_processes=2, block=False)
+        with pytest.raises(RuntimeError, match="not been started"):
+            loop.wait()
+
+        for i in loop:
+            total += i
+
+        loop.wait(timeout=30)
+        assert loop.done()
+        assert total == sum(range(100))
+
+    def test_error(self):
+        loop = ParaLoop(range(10), num_processes=2, block=False)
+        for i in loop:
+            if i == 5:
+                raise ValueError("Something went wrong!")
+
+        with pytest.raises(ValueError, match="went wrong"):
+            loop.wait(timeout=30)
+        assert loop.done()
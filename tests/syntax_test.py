@@ -0,0 +1,123 @@
+import functools
+
+from paraloop import Variable
+from paraloop.aggregation_strategies import Concatenate, Sum
+from paraloop.syntax import LoopTransformer
+
+recorded = Variable([], aggregation_strategy=Concatenate)
+
+
+def record(x):
+    recorded.append(x)
+
+
+def record_twice(x):
+    # Variables used by nested calls are found as well.
+    [record(y) for y in (x, x)]
+
+
+class Recorder:
+    def __init__(self, x=None):
+        if x is not None:
+            self.add(x)
+
+    def add(self, x):
+        record(x)
+
+
+recorder = Recorder()
+record_partial = functools.partial(record)
+variables = [recorded]
+
+
+def variable_usage(source: str):
+    scope = {
+        "total": Variable(0, aggregation_strategy=Sum),
+        "items": Variable([], aggregation_strategy=Concatenate),
+        "lookup": Variable({}, aggregation_strategy=Concatenate),
+        "unused": Variable(0, aggregation_strategy=Sum),
+    }
+    transformer = LoopTransformer(source, scope, {})
+    transformer.build_loop_function()
+    return transformer.read_variables, transformer.written_variables
+
+
+class TestVariableUsage:
+    def test_untouched(self):
+        read, written = variable_usage("for i in range(10):\n    print(i)")
+        assert read == set()
+        assert written == set()
+
+    def test_writes(self):
+        read, written = variable_usage(
+            "for i in range(10):\n"
+            "    total += i\n"
+            "    items.append(i)\n"
+            "    lookup[i] = total\n"
+        )
+        assert read == {"total", "items", "lookup"}
+        assert written == {"total", "items", "lookup"}
+
+    def test_read_only(self):
+        read, written = variable_usage(
+            "for i in range(10):\n"
+            "    if i < len(items) and lookup[i] > 0:\n"
+            "        print(f'{total}', lookup[i].shape, total + 1)\n"
+        )
+        assert read == {"total", "items", "lookup"}
+        assert written == set()
+
+    def test_conservative(self):
+        # Aliasing, unknown functions and mutating nested values all count as writes.
+        read, written = variable_usage(
+            "for i in range(10):\n"
+            "    alias = total\n"
+            "    sorted(items)\n"
+            "    lookup[i].append(i)\n"
+        )
+        assert written == {"total", "items", "lookup"}
+
+    def test_functions(self):
+        for helper in ["record", "record_twice"]:
+            transformer = LoopTransformer(
+                f"for i in range(10):\n    {helper}(i)\n", globals(), {}
+            )
+            transformer.build_loop_function()
+            assert transformer.written_variables == {"recorded"}
+
+        # Closures and functions that are passed around rather than called
+        closed = Variable([], aggregation_strategy=Concatenate)
+
+        def add(x):
+            closed.append(x)
+
+        transformer = LoopTransformer(
+            "for i in range(10):\n    list(map(add, [i]))\n",
+            globals(),
+            {"closed": closed, "add": add},
+        )
+        transformer.build_loop_function()
+        assert transformer.written_variables == {"closed"}
+
+    def test_objects(self):
+        # Methods, classes, partial functions and containers of Variables
+        for statement in [
+            "recorder.add(i)",
+            "Recorder(i)",
+            "record_partial(i)",
+            "variables[0].append(i)",
+        ]:
+            transformer = LoopTransformer(
+                f"for i in range(10):\n    {statement}\n", globals(), {}
+            )
+            transformer.build_loop_function()
+            assert transformer.written_variables == {"recorded"}
+
+        # Objects that can't be inspected may use any Variable.
+        transformer = LoopTransformer(
+            "for i in range(10):\n    next(iterator)\n",
+            globals(),
+            {"iterator": iter([]), "other": Variable(0, aggregation_strategy=Sum)},
+        )
+        transformer.build_loop_function()
+        assert transformer.written_variables == {"recorded", "other"}